@@ -208,6 +208,8 @@ THEFEDERATION_URL = "{protocol}://{domain}".format(
     protocol="https" if THEFEDERATION_HTTPS else "http",
     domain=THEFEDERATION_DOMAIN
 )
+# How long to cache the stats of the day, in seconds
+THEFEDERATION_STAT_CACHE_TIMEOUT = env.int("THEFEDERATION_STAT_CACHE_TIMEOUT", default=300)
 THEFEDERATION_LEGACY_HOST = env("THEFEDERATION_LEGACY_HOST", default='localhost')
 THEFEDERATION_LEGACY_USER = env("THEFEDERATION_LEGACY_USER", default='thefederation')
 THEFEDERATION_LEGACY_PASSWORD = env("THEFEDERATION_LEGACY_PASSWORD", default=None)
@@ -32,12 +32,25 @@ EMAIL_BACKEND = env("DJANGO_EMAIL_BACKEND",
 
 # CACHING
 # ------------------------------------------------------------------------------
-CACHES = {
-    "default": {
-        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
-        "LOCATION": ""
+# Use a shared cache like production, so that profiling with multiple workers reflects real hit rates
+if testing:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": ""
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django_redis.cache.RedisCache",
+            "LOCATION": "redis://%s:%s/%s" % (REDIS_HOST, REDIS_PORT, REDIS_DB),
+            "OPTIONS": {
+                "CLIENT_CLASS": "django_redis.client.DefaultClient",
+                "PASSWORD": REDIS_PASSWORD,
+            }
+        }
     }
-}
 
 # django-debug-toolbar
 # ------------------------------------------------------------------------------
@@ -51,6 +64,11 @@ if env.bool("DJANGO_DEBUG_TOOLBAR", default=True):
     DEBUG_TOOLBAR_CONFIG = {
         "SHOW_TEMPLATE_CONTEXT": True,
     }
+    # These instrument every query and template render, enable them when not profiling throughput
+    _heavy_panels = {
+        "debug_toolbar.panels.sql.SQLPanel",
+        "debug_toolbar.panels.templates.TemplatesPanel",
+    }
     DEBUG_TOOLBAR_PANELS = [
         "debug_toolbar_user_panel.panels.UserPanel",
         "debug_toolbar.panels.versions.VersionsPanel",
@@ -66,17 +84,22 @@ if env.bool("DJANGO_DEBUG_TOOLBAR", default=True):
         "debug_toolbar.panels.logging.LoggingPanel",
         "debug_toolbar.panels.redirects.RedirectsPanel",
     ]
+    if not env.bool("DJANGO_DEBUG_TOOLBAR_HEAVY_PANELS", default=False):
+        DEBUG_TOOLBAR_PANELS = [panel for panel in DEBUG_TOOLBAR_PANELS if panel not in _heavy_panels]
 
 # RQ
 # --
-RQ_QUEUES["default"]["ASYNC"] = False
+# Run jobs inline only in tests, use a local worker otherwise
+if testing:
+    RQ_QUEUES["default"]["ASYNC"] = False
 
 # The Federation
 # ------------------------------------------------------------------------------
 THEFEDERATION_HTTPS = False
 
 # Extra tools for development
-MIDDLEWARE += ("querycount.middleware.QueryCountMiddleware",)
+if env.bool("DJANGO_QUERYCOUNT", default=False):
+    MIDDLEWARE += ("querycount.middleware.QueryCountMiddleware",)
 
 # Tests
 if testing:
@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from thefederation.models import Node, Platform, Protocol, Service, Stat
+from thefederation.models import Node, Platform, Protocol, Service, Stat, StatDailyRollup
 
 
 class NodeAdmin(admin.ModelAdmin):
@@ -33,8 +33,15 @@ class StatAdmin(admin.ModelAdmin):
     search_fields = ['date', 'node__name']
 
 
+class StatDailyRollupAdmin(admin.ModelAdmin):
+    list_display = ('__str__', 'date', 'item_type', 'value')
+    list_filter = ('item_type',)
+    search_fields = ['date', 'value']
+
+
 admin.site.register(Node, NodeAdmin)
 admin.site.register(Platform, PlatformAdmin)
 admin.site.register(Protocol, ProtocolAdmin)
 admin.site.register(Service, ServiceAdmin)
 admin.site.register(Stat, StatAdmin)
+admin.site.register(StatDailyRollup, StatDailyRollupAdmin)
@@ -0,0 +1,129 @@
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from promise import Promise
+from promise.dataloader import DataLoader
+
+from thefederation.models import Node, Stat, StatDailyRollup
+from thefederation.utils import stat_cache_key
+
+
+class StatDateCountsLoader(DataLoader):
+    """
+    Loads the per date sums of a stat column.
+
+    Keys are ``(stat, value, item_type, from_date)`` tuples. All keys sharing the same filters are
+    loaded with a single query, no matter how many stat columns are requested. Series of all nodes,
+    platforms and protocols are read from the daily rollups.
+    """
+    def batch_load_fn(self, keys):
+        stats = defaultdict(set)
+        for stat, *filters in keys:
+            stats[tuple(filters)].add(stat)
+
+        rows = {}
+        for filters, filter_stats in stats.items():
+            value, item_type, from_date = filters
+            # A node has only one stat per date, so there is nothing to roll up for them
+            model = Stat if item_type == 'node' else StatDailyRollup
+            rows[filters] = list(model.objects.date_counts(
+                filter_stats, from_date=from_date, item_type=item_type, value=value,
+            ))
+
+        return Promise.resolve([
+            [{'date': row['date'], 'count': row[f'sum_{stat}']} for row in rows[tuple(filters)]]
+            for stat, *filters in keys
+        ])
+
+
+class TodayStatLoader(DataLoader):
+    """
+    Loads the monthly active users of nodes, keyed by ``(node_id, date)`` tuples.
+    """
+    def batch_load_fn(self, keys):
+        users = {
+            (node_id, date): node_users for node_id, date, node_users in Stat.objects.filter(
+                node_id__in={node_id for node_id, _date in keys},
+                date__in={date for _node_id, date in keys},
+            ).values_list('node_id', 'date', 'users_monthly')
+        }
+        return Promise.resolve([users.get(key) for key in keys])
+
+
+class NamedStatLoader(DataLoader):
+    """
+    Loads platform or protocol stats, keyed by ``(name, date)`` tuples.
+
+    Found stats are cached, see ``stat_cache_key``.
+    """
+    relation = None
+
+    def batch_load_fn(self, keys):
+        cache_keys = {key: stat_cache_key(self.relation, key[1], key[0]) for key in keys}
+        cached = cache.get_many(cache_keys.values())
+        stats = {key: cached[cache_key] for key, cache_key in cache_keys.items() if cache_key in cached}
+
+        missing = [key for key in keys if key not in stats]
+        if missing:
+            other = 'protocol' if self.relation == 'platform' else 'platform'
+            qs = Stat.objects.filter(**{
+                'node__isnull': True,
+                f'{other}__isnull': True,
+                f'{self.relation}__name__in': {name for name, _date in missing},
+                'date__in': {date for _name, date in missing},
+            }).select_related(self.relation)
+            found = {(getattr(stat, self.relation).name, stat.date): stat for stat in qs}
+            cache.set_many(
+                {cache_keys[key]: stat for key, stat in found.items() if key in cache_keys},
+                timeout=settings.THEFEDERATION_STAT_CACHE_TIMEOUT,
+            )
+            stats.update(found)
+
+        return Promise.resolve([stats.get(key) for key in keys])
+
+
+class PlatformTodayStatLoader(NamedStatLoader):
+    relation = 'platform'
+
+
+class ProtocolTodayStatLoader(NamedStatLoader):
+    relation = 'protocol'
+
+
+class ServicesByNodeLoader(DataLoader):
+    """
+    Loads the services of nodes, keyed by node ID.
+    """
+    def batch_load_fn(self, node_ids):
+        services = defaultdict(list)
+        for node_service in Node.services.through.objects.filter(node_id__in=node_ids).select_related('service'):
+            services[node_service.node_id].append(node_service.service)
+        return Promise.resolve([services[node_id] for node_id in node_ids])
+
+
+class Loaders:
+    """
+    Request scoped collection of data loaders.
+    """
+    def __init__(self):
+        self.stat_date_counts = StatDateCountsLoader()
+        self.today_stat = TodayStatLoader()
+        self.platform_today = PlatformTodayStatLoader()
+        self.protocol_today = ProtocolTodayStatLoader()
+        self.services_by_node = ServicesByNodeLoader()
+
+
+def get_loaders(info):
+    """
+    Get the data loaders of the current request.
+
+    The loaders are stored on the request so that each request gets a fresh cache. If there is
+    no context to store them on, a new set of loaders is returned.
+    """
+    context = info.context
+    if context is None:
+        return Loaders()
+    if not hasattr(context, 'loaders'):
+        context.loaders = Loaders()
+    return context.loaders
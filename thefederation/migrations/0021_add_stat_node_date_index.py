@@ -0,0 +1,17 @@
+# Generated by Django 2.2.13 on 2026-10-14 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('thefederation', '0020_remove_port_from_node_hostnames'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='stat',
+            index=models.Index(fields=['node', 'date'], name='stat_node_date_idx'),
+        ),
+    ]
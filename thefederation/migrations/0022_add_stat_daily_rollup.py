@@ -0,0 +1,58 @@
+# Generated by Django 2.2.13 on 2026-10-14 12:00
+
+from django.db import migrations, models
+from django.db.migrations import RunPython
+from django.db.models import Count, Sum
+
+STATS = ('users_total', 'users_half_year', 'users_monthly', 'users_weekly', 'local_posts', 'local_comments')
+
+
+def forward(apps, schema):
+    Stat = apps.get_model("thefederation", "Stat")
+    StatDailyRollup = apps.get_model("thefederation", "StatDailyRollup")
+    sums = {f'sum_{stat}': Sum(stat) for stat in STATS}
+    sums['node_count'] = Count('users_total')
+    qs = Stat.objects.filter(node__isnull=False)
+    rollups = []
+    for item_type, lookup in (('all', None), ('platform', 'node__platform__name'), ('protocol', 'node__protocols__name')):
+        if lookup:
+            rows = qs.filter(**{f'{lookup}__isnull': False}).values('date', lookup).annotate(**sums).order_by()
+        else:
+            rows = qs.values('date').annotate(**sums).order_by()
+        for row in rows.iterator():
+            rollups.append(StatDailyRollup(
+                date=row['date'], item_type=item_type, value=row[lookup] if lookup else '',
+                node_count=row['node_count'],
+                **{stat: row[f'sum_{stat}'] for stat in STATS}
+            ))
+    StatDailyRollup.objects.bulk_create(rollups, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('thefederation', '0021_add_stat_node_date_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatDailyRollup',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('item_type', models.CharField(choices=[('all', 'all'), ('platform', 'platform'), ('protocol', 'protocol')], max_length=30)),
+                ('value', models.CharField(blank=True, max_length=80)),
+                ('users_total', models.PositiveIntegerField(null=True)),
+                ('users_half_year', models.PositiveIntegerField(null=True)),
+                ('users_monthly', models.PositiveIntegerField(null=True)),
+                ('users_weekly', models.PositiveIntegerField(null=True)),
+                ('local_posts', models.PositiveIntegerField(null=True)),
+                ('local_comments', models.PositiveIntegerField(null=True)),
+                ('node_count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'unique_together': {('item_type', 'value', 'date')},
+            },
+        ),
+        RunPython(forward, RunPython.noop),
+    ]
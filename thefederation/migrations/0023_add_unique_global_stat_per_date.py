@@ -0,0 +1,17 @@
+# Generated by Django 2.2.13 on 2026-10-14 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('thefederation', '0022_add_stat_daily_rollup'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='stat',
+            constraint=models.UniqueConstraint(condition=models.Q(('node__isnull', True), ('platform__isnull', True), ('protocol__isnull', True)), fields=('date',), name='stat_global_date_uniq'),
+        ),
+    ]
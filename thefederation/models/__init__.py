@@ -1,5 +1,6 @@
 from .node import *
 from .platform import *
 from .protocol import *
+from .rollup import *
 from .service import *
 from .stat import *
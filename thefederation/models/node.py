@@ -3,6 +3,7 @@ import re
 
 from django.contrib.postgres.fields import JSONField
 from django.db import models
+from django.db.models import Q
 from django.utils.functional import cached_property
 from django.utils.timezone import now
 from django_countries.fields import CountryField
@@ -16,11 +17,20 @@ __all__ = ('Node',)
 
 
 class NodeQuerySet(models.QuerySet):
+    @staticmethod
+    def active_q(prefix=''):
+        """
+        Get the conditions for an active node.
+
+        :param prefix: Lookup prefix to use when filtering through a relation, for example "nodes__".
+        """
+        return Q(**{
+            f'{prefix}blocked': False,
+            f'{prefix}last_success__gte': now() - datetime.timedelta(days=30),
+        })
+
     def active(self):
-        return self.filter(
-            blocked=False,
-            last_success__gte=now() - datetime.timedelta(days=30),
-        )
+        return self.filter(self.active_q())
 
 
 class Node(ModelBase):
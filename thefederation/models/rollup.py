@@ -0,0 +1,87 @@
+from django.db import models
+from django.db.models import F, FloatField
+from django.db.models.functions import Cast, NullIf
+
+from thefederation.models.stat import Stat, active_ratio, check_item_type
+
+__all__ = ('StatDailyRollup',)
+
+
+class StatDailyRollupQuerySet(models.QuerySet):
+    def date_counts(self, stats, from_date, item_type=None, value=None):
+        """
+        Per date values of each of the given stat columns.
+
+        Rows are in the same format as ``StatQuerySet.date_counts``, so each column is available
+        under its name prefixed with ``sum_``.
+        """
+        return self.for_item(item_type, value).filter(
+            date__gte=from_date,
+        ).values(
+            'date', **{f'sum_{stat}': F(stat) for stat in stats}
+        ).order_by('date')
+
+    def for_item(self, item_type=None, value=None):
+        """
+        Rollups of all nodes, or only those of a given platform or protocol.
+
+        Nodes are not rolled up, so there are no rollups for a node.
+        """
+        if not value or not item_type:
+            return self.filter(item_type=StatDailyRollup.ITEM_TYPE_ALL, value='')
+        check_item_type(item_type)
+        return self.filter(item_type=item_type, value=value)
+
+    def users_active_ratios(self, from_date, item_type=None, value=None):
+        return self.for_item(item_type, value).filter(date__gte=from_date).annotate(
+            count=active_ratio(F('users_monthly'), F('users_total')),
+        ).values('date', 'count').order_by('date')
+
+    def users_per_node(self, from_date, item_type=None, value=None):
+        return self.for_item(item_type, value).filter(date__gte=from_date).annotate(
+            count=Cast(F('users_total'), FloatField()) / NullIf(F('node_count'), 0),
+        ).values('date', 'count').order_by('date')
+
+
+class StatDailyRollup(models.Model):
+    """
+    Sums of node stats per date, for all nodes or the nodes of a platform or protocol.
+
+    Unlike the platform and protocol rows in Stat, these include the stats of inactive nodes,
+    matching what the stat date series have always shown.
+    """
+    ITEM_TYPE_ALL = 'all'
+    ITEM_TYPE_PLATFORM = 'platform'
+    ITEM_TYPE_PROTOCOL = 'protocol'
+    ITEM_TYPES = (
+        (ITEM_TYPE_ALL, ITEM_TYPE_ALL),
+        (ITEM_TYPE_PLATFORM, ITEM_TYPE_PLATFORM),
+        (ITEM_TYPE_PROTOCOL, ITEM_TYPE_PROTOCOL),
+    )
+    STATS = Stat.STATS
+
+    date = models.DateField()
+    item_type = models.CharField(choices=ITEM_TYPES, max_length=30)
+    # Name of the platform or protocol, empty for all nodes
+    value = models.CharField(max_length=80, blank=True)
+
+    users_total = models.PositiveIntegerField(null=True)
+    users_half_year = models.PositiveIntegerField(null=True)
+    users_monthly = models.PositiveIntegerField(null=True)
+    users_weekly = models.PositiveIntegerField(null=True)
+    local_posts = models.PositiveIntegerField(null=True)
+    local_comments = models.PositiveIntegerField(null=True)
+    # Node stats with a users total, which the users per node are averaged over
+    node_count = models.PositiveIntegerField(default=0)
+
+    objects = StatDailyRollupQuerySet.as_manager()
+
+    class Meta:
+        unique_together = (
+            ('item_type', 'value', 'date'),
+        )
+
+    def __str__(self):
+        if self.value:
+            return f"{self.item_type} {self.value} <{self.date}>"
+        return f"{self.item_type} <{self.date}>"
@@ -1,15 +1,67 @@
 import datetime
 
 from django.db import models
-from django.db.models import Count
+from django.db.models import Avg, Count, ExpressionWrapper, FloatField, Sum, Q
+from django.db.models.functions import Cast, NullIf
 from django.utils.timezone import now
 
+from thefederation.models.node import Node
 from thefederation.utils import single_true
 
 __all__ = ('Stat',)
 
+# Node lookups to filter node stats on by item type
+ITEM_TYPE_FILTERS = {
+    'node': 'host',
+    'platform': 'platform__name',
+    'protocol': 'protocols__name',
+}
+
+
+def check_item_type(item_type):
+    """
+    Raise a ValueError if the item type is not one of ``ITEM_TYPE_FILTERS``.
+    """
+    if item_type not in ITEM_TYPE_FILTERS:
+        raise ValueError('itemType should be "platform", "node" or "protocol"')
+
+
+def active_ratio(users_monthly, users_total):
+    """
+    Ratio of monthly active users to total users, null when there are no total users.
+    """
+    return ExpressionWrapper(
+        Cast(users_monthly, FloatField()) / NullIf(users_total, 0), output_field=FloatField(),
+    )
+
 
 class StatQuerySet(models.QuerySet):
+    def date_counts(self, stats, from_date, item_type=None, value=None):
+        """
+        Sum of each of the given stat columns per date.
+
+        All the columns are aggregated in one query. Each column sum is available in the result rows
+        under its column name prefixed with ``sum_``.
+        """
+        qs = self.for_item(item_type, value)
+
+        qs = qs.filter(date__gte=from_date)
+
+        sums = {f'sum_{stat}': Sum(stat) for stat in stats}
+        return qs.values('date').annotate(**sums).values('date', *sums.keys()).order_by('date')
+
+    def users_active_ratios(self, from_date, item_type=None, value=None):
+        qs = self.for_item(item_type, value).filter(date__gte=from_date)
+        return qs.values('date').annotate(
+            count=active_ratio(Sum('users_monthly'), Sum('users_total')),
+        ).values('date', 'count').order_by('date')
+
+    def users_per_node(self, from_date, item_type=None, value=None):
+        qs = self.for_item(item_type, value).filter(date__gte=from_date)
+        return qs.values('date').annotate(
+            count=Avg('users_total'),
+        ).values('date', 'count').order_by('date')
+
     def for_days(self, from_date=None, platform=None, protocol=None, node=None):
         assert not all([platform, protocol, node])
         if not from_date:
@@ -30,20 +82,21 @@ class StatQuerySet(models.QuerySet):
     def for_global(self):
         return self.filter(node__isnull=True, protocol__isnull=True, platform__isnull=True)
 
+    def for_item(self, item_type=None, value=None):
+        """
+        Node stats, optionally only those of a given platform, protocol or node.
+        """
+        if not value or not item_type:
+            return self.filter(node__isnull=False)
+        check_item_type(item_type)
+        lookup = ITEM_TYPE_FILTERS[item_type]
+        # Restrict with a subquery on nodes rather than joining, so other filters on the stats can be applied first
+        return self.filter(node__in=Node.objects.filter(**{lookup: value}).values('pk'))
+
     def node_counts(self, from_date=None, item_type=None, value=None):
         if not from_date:
             from_date = now().date() - datetime.timedelta(days=1)
-        if value and item_type:
-            if item_type == 'platform':
-                qs = self.filter(node__platform__name=value)
-            elif item_type == 'protocol':
-                qs = self.filter(node__protocols__name=value)
-            elif item_type == 'node':
-                qs = self.filter(node__host=value)
-            else:
-                raise ValueError('item_type should be "platform", "node" or "protocol')
-        else:
-            qs = self.filter(node__isnull=False)
+        qs = self.for_item(item_type, value)
 
         qs = qs.filter(date__gte=from_date)
 
@@ -53,6 +106,8 @@ class StatQuerySet(models.QuerySet):
 
 
 class Stat(models.Model):
+    STATS = ('users_total', 'users_half_year', 'users_monthly', 'users_weekly', 'local_posts', 'local_comments')
+
     date = models.DateField(db_index=True)
 
     # NOTE! only one or the other node or platform or protocol can be filled
@@ -74,6 +129,17 @@ class Stat(models.Model):
     objects = StatQuerySet.as_manager()
 
     class Meta:
+        constraints = [
+            # Only one global stat per date
+            models.UniqueConstraint(
+                fields=['date'], name='stat_global_date_uniq',
+                condition=Q(node__isnull=True, platform__isnull=True, protocol__isnull=True),
+            ),
+        ]
+        indexes = [
+            # Series of a single node are filtered on node first
+            models.Index(fields=['node', 'date'], name='stat_node_date_idx'),
+        ]
         unique_together = (
             ('date', 'node'),
             ('date', 'platform'),
@@ -1,14 +1,55 @@
 import datetime
 
 import graphene
-from django.db.models import Subquery, OuterRef, Count, Max, IntegerField, F, Sum, Avg, FloatField
-from django.db.models.functions import Cast
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Count, Sum, FilteredRelation, Q, F
 from django.utils.timezone import now
 from django_countries.data import COUNTRIES
 from django_countries.fields import Country
-from graphene_django import DjangoObjectType
+from graphene.utils.str_converters import to_snake_case
+from graphene_django import DjangoObjectType, DjangoConnectionField, DjangoListField
+from graphql.language.ast import FragmentSpread, InlineFragment
+
+from thefederation.loaders import get_loaders
+from thefederation.models import Node, Platform, Protocol, Stat, StatDailyRollup, Service
+from thefederation.models.stat import check_item_type
+from thefederation.utils import stat_cache_key
+
+
+def collect_selected(info):
+    """
+    Collect the names of the fields selected on the field being resolved.
+
+    Fragments are followed, so fields selected through them are included too.
+    """
+    selected = set()
+    selection_sets = [field.selection_set for field in info.field_asts]
+    while selection_sets:
+        selection_set = selection_sets.pop()
+        if not selection_set:
+            continue
+        for selection in selection_set.selections:
+            if isinstance(selection, FragmentSpread):
+                selection_sets.append(info.fragments[selection.name.value].selection_set)
+            elif isinstance(selection, InlineFragment):
+                selection_sets.append(selection.selection_set)
+            else:
+                selected.add(selection.name.value)
+    return selected
+
 
-from thefederation.models import Node, Platform, Protocol, Stat, Service
+def get_today(info):
+    """
+    Get the current date, memoized on the request so it's only calculated once.
+    """
+    context = info.context
+    if context is None:
+        return now().date()
+    if not hasattr(context, 'today'):
+        context.today = now().date()
+    return context.today
 
 
 class CountryStatType(graphene.ObjectType):
@@ -67,31 +108,59 @@ class DateFloatCountType(graphene.ObjectType):
         return self.get('date')
 
 
+class StatType(DjangoObjectType):
+    class Meta:
+        model = Stat
+        # Reverse relations to stats are declared as list fields on their types, so they stay lists
+        use_connection = True
+
+
 class NodeType(DjangoObjectType):
     country_code = graphene.String()
     country_flag = graphene.String()
     country_name = graphene.String()
+    users = graphene.Int()
+    stats = DjangoListField(StatType, required=True)
 
     class Meta:
         model = Node
 
+    @staticmethod
+    def _get_country(node):
+        # The country field builds a new Country on every access, so only build it once per node
+        if not hasattr(node, '_country'):
+            node._country = node.country
+        return node._country
+
     def resolve_country_code(self, info):
-        return self.country.code
+        return NodeType._get_country(self).code
 
     def resolve_country_flag(self, info):
-        return self.country.unicode_flag
+        return NodeType._get_country(self).unicode_flag
 
     def resolve_country_name(self, info):
-        return self.country.name
+        return NodeType._get_country(self).name
+
+    def resolve_services(self, info):
+        return get_loaders(info).services_by_node.load(self.pk)
+
+    def resolve_users(self, info):
+        # Annotated when coming from resolve_nodes
+        if hasattr(self, 'users'):
+            return self.users
+        return get_loaders(info).today_stat.load((self.pk, get_today(info)))
 
 
 class PlatformType(DjangoObjectType):
+    stat_set = DjangoListField(StatType, required=True)
+
     class Meta:
         model = Platform
 
 
 class ProtocolType(DjangoObjectType):
     active_nodes = graphene.Int()
+    stat_set = DjangoListField(StatType, required=True)
 
     class Meta:
         model = Protocol
@@ -105,11 +174,6 @@ class ServiceType(DjangoObjectType):
         model = Service
 
 
-class StatType(DjangoObjectType):
-    class Meta:
-        model = Stat
-
-
 class Query:
     DEFAULT_PERIOD = '1y'
 
@@ -135,7 +199,7 @@ class Query:
         ServiceType,
         name=graphene.String(),
     )
-    stats = graphene.List(StatType)
+    stats = DjangoConnectionField(StatType, enforce_first_or_last=True)
     stats_counts_nodes = graphene.List(
         DateCountType,
         value=graphene.String(),
@@ -227,25 +291,40 @@ class Query:
         raise ValueError('Invalid period, should be for example 5d, 5m or 5y')
 
     @staticmethod
-    def _get_stat_date_counts(stat, value=None, item_type=None, from_date=None):
+    def _get_node_only_fields(selected):
+        """
+        Get the Node model fields needed to resolve the selected NodeType fields.
+        """
+        fields = {'id'}
+        for name in selected:
+            name = to_snake_case(name)
+            if name.startswith('country_'):
+                name = 'country'
+            try:
+                field = Node._meta.get_field(name)
+            except FieldDoesNotExist:
+                continue
+            if field.concrete and not field.many_to_many:
+                fields.add(field.name)
+        return fields
+
+    @staticmethod
+    def _get_series_model(item_type, value):
+        """
+        Get the model to read a series from, only series of a single node aren't rolled up.
+        """
+        return Stat if value and item_type == 'node' else StatDailyRollup
+
+    @staticmethod
+    def _get_stat_date_counts(info, stat, value=None, item_type=None, from_date=None):
         if not from_date:
-            from_date = Query._get_from_date_from_period(Query.DEFAULT_PERIOD)
-        qs = Stat.objects.filter(date__gte=from_date)
-        if value and item_type:
-            if item_type == 'platform':
-                qs = qs.filter(node__platform__name=value)
-            elif item_type == 'protocol':
-                qs = qs.filter(node__protocols__name=value)
-            elif item_type == 'node':
-                qs = qs.filter(node__host=value)
-            else:
-                raise ValueError('itemType should be "platform", "node" or "protocol')
+            from_date = Query._get_from_date_from_period(Query.DEFAULT_PERIOD, date=get_today(info))
+        if not value or not item_type:
+            value = item_type = None
         else:
-            qs = qs.filter(node__isnull=False)
-
-        return qs.values('date').annotate(
-            count=Sum(stat)
-        ).values('date', 'count').order_by('date')
+            # Check here rather than in the loader, which would fail all the series loaded in the same batch
+            check_item_type(item_type)
+        return get_loaders(info).stat_date_counts.load((stat, value, item_type, from_date))
 
     def resolve_country_stats(self, info, **kwargs):
         """
@@ -259,25 +338,30 @@ class Query:
         return qs
 
     def resolve_nodes(self, info, **kwargs):
+        qs = Node.objects.active()
         if kwargs.get('platform'):
-            qs = Node.objects.active().filter(platform__name=kwargs.get('platform'))
+            qs = qs.filter(platform__name=kwargs.get('platform'))
         elif kwargs.get('protocol'):
-            qs = Node.objects.active().filter(protocols__name=kwargs.get('protocol'))
-        else:
-            qs = Node.objects.active()
+            qs = qs.filter(protocols__name=kwargs.get('protocol'))
 
         if kwargs.get('host'):
             qs = qs.filter(host=kwargs.get('host'))
 
-        stat = Stat.objects.filter(
-            node=OuterRef('pk'), date=now().date()
-        ).values('users_monthly').annotate(users=Max('users_monthly')).values('users')
+        selected = collect_selected(info)
+        if 'platform' in selected:
+            qs = qs.select_related('platform')
+        if 'protocols' in selected:
+            qs = qs.prefetch_related('protocols')
 
-        return qs.active().annotate(
-            users=Subquery(stat, output_field=IntegerField())
+        return qs.annotate(
+            today_stats=FilteredRelation('stats', condition=Q(stats__date=get_today(info))),
+        ).annotate(
+            users=F('today_stats__users_monthly'),
         ).order_by(
-            F('users').desc(nulls_last=True)
-        ).select_related('platform').prefetch_related('services')
+            F('users').desc(nulls_last=True), 'host',
+        ).only(
+            *Query._get_node_only_fields(selected),
+        )
 
     def resolve_platforms(self, info, **kwargs):
         if kwargs.get('name'):
@@ -285,10 +369,11 @@ class Query:
         else:
             qs = Platform.objects.all()
 
-        nodes = Node.objects.active().filter(
-            platform=OuterRef('pk')).values('platform').annotate(c=Count('*')).values('c')
-        return qs.prefetch_related('nodes').annotate(
-            active_nodes=Subquery(nodes, output_field=IntegerField())
+        if 'nodes' in collect_selected(info):
+            qs = qs.prefetch_related('nodes')
+
+        return qs.annotate(
+            active_nodes=Count('nodes', filter=Node.objects.active_q('nodes__'))
         ).filter(active_nodes__gt=0).order_by('-active_nodes')
 
     def resolve_protocols(self, info, **kwargs):
@@ -297,24 +382,36 @@ class Query:
         else:
             qs = Protocol.objects.all()
 
-        nodes = Node.objects.active().filter(
-            protocols=OuterRef('pk')).values('protocols').annotate(c=Count('*')).values('c')
-        return qs.prefetch_related('nodes').annotate(
-            active_nodes=Subquery(nodes, output_field=IntegerField())
+        if 'nodes' in collect_selected(info):
+            qs = qs.prefetch_related('nodes')
+
+        return qs.annotate(
+            active_nodes=Count('nodes', filter=Node.objects.active_q('nodes__'))
         ).filter(active_nodes__gt=0).order_by('-active_nodes')
 
     def resolve_stats(self, info, **kwargs):
-        return Stat.objects.all()
+        return Stat.objects.order_by('-date', 'pk')
 
     def resolve_stats_counts_nodes(self, info, **kwargs):
         return Stat.objects.node_counts(
-            from_date=Query._get_from_date_from_period(kwargs.get('period', Query.DEFAULT_PERIOD)),
+            from_date=Query._get_from_date_from_period(
+                kwargs.get('period', Query.DEFAULT_PERIOD), date=get_today(info),
+            ),
             item_type=kwargs.get('itemType'),
             value=kwargs.get('value'),
         ).order_by('-date')
 
     def resolve_stats_global_today(self, info, **kwargs):
-        return Stat.objects.for_days(platform=kwargs.get('platform'), protocol=kwargs.get('protocol')).first()
+        platform = kwargs.get('platform')
+        protocol = kwargs.get('protocol')
+        today = get_today(info)
+        return cache.get_or_set(
+            stat_cache_key('global', today, platform, protocol),
+            lambda: Stat.objects.for_days(
+                from_date=today - datetime.timedelta(days=1), platform=platform, protocol=protocol,
+            ).first(),
+            timeout=settings.THEFEDERATION_STAT_CACHE_TIMEOUT,
+        )
 
     def resolve_stats_nodes(self, info, **kwargs):
         if kwargs.get('itemType'):
@@ -330,114 +427,113 @@ class Query:
             item_type = None
             value = None
 
-        if item_type == 'platform':
-            qs = Stat.objects.filter(node__platform__name=value)
-        elif item_type == 'protocol':
-            qs = Stat.objects.filter(node__protocols__name=value)
-        else:
-            qs = Stat.objects.all()
+        qs = Stat.objects.filter(
+            date=get_today(info), protocol__isnull=True, platform__isnull=True,
+        ).for_item(item_type, value)
 
         if kwargs.get('host'):
-            qs = qs.filter(node__host=kwargs.get('host'))
+            qs = qs.for_item('node', kwargs.get('host'))
 
-        return qs.filter(date=now().date(), node__isnull=False, protocol__isnull=True, platform__isnull=True)
+        return qs
 
     def resolve_stats_platform_today(self, info, **kwargs):
         name = kwargs.get('name')
         if not name:
             return Stat.objects.none()
 
-        return Stat.objects.filter(
-            node__isnull=True, protocol__isnull=True, platform__name=name, date=now().date(),
-        ).first()
+        return get_loaders(info).platform_today.load((name, get_today(info)))
 
     def resolve_stats_protocol_today(self, info, **kwargs):
         name = kwargs.get('name')
         if not name:
             return Stat.objects.none()
 
-        return Stat.objects.filter(
-            node__isnull=True, platform__isnull=True, protocol__name=name, date=now().date(),
-        ).first()
+        return get_loaders(info).protocol_today.load((name, get_today(info)))
 
     def resolve_stats_users_active_ratio(self, info, **kwargs):
-        qs = Stat.objects.filter(date__gte=Query._get_from_date_from_period(kwargs.get('period', Query.DEFAULT_PERIOD)))
-        if kwargs.get('value') and kwargs.get('itemType'):
-            if kwargs.get('itemType') == 'platform':
-                qs = qs.filter(node__platform__name=kwargs.get('value'))
-            elif kwargs.get('itemType') == 'protocol':
-                qs = qs.filter(node__protocols__name=kwargs.get('value'))
-            elif kwargs.get('itemType') == 'node':
-                qs = qs.filter(node__host=kwargs.get('value'))
-            else:
-                raise ValueError('itemType should be "platform", "node" or "protocol')
-        else:
-            qs = qs.filter(node__isnull=False)
-        return qs.values('date').annotate(
-            count=Cast(Sum('users_monthly'), FloatField()) / Cast(Sum('users_total'), FloatField()),
-        ).values('date', 'count').order_by('date')
+        item_type = kwargs.get('itemType')
+        value = kwargs.get('value')
+        return Query._get_series_model(item_type, value).objects.users_active_ratios(
+            from_date=Query._get_from_date_from_period(
+                kwargs.get('period', Query.DEFAULT_PERIOD), date=get_today(info),
+            ),
+            item_type=item_type,
+            value=value,
+        )
 
     def resolve_stats_users_total(self, info, **kwargs):
         return Query._get_stat_date_counts(
+            info,
             'users_total',
             value=kwargs.get('value'),
             item_type=kwargs.get('itemType'),
-            from_date=Query._get_from_date_from_period(kwargs.get('period', Query.DEFAULT_PERIOD)),
+            from_date=Query._get_from_date_from_period(
+                kwargs.get('period', Query.DEFAULT_PERIOD), date=get_today(info),
+            ),
         )
 
     def resolve_stats_users_half_year(self, info, **kwargs):
         return Query._get_stat_date_counts(
+            info,
             'users_half_year',
             value=kwargs.get('value'),
             item_type=kwargs.get('itemType'),
-            from_date=Query._get_from_date_from_period(kwargs.get('period', Query.DEFAULT_PERIOD)),
+            from_date=Query._get_from_date_from_period(
+                kwargs.get('period', Query.DEFAULT_PERIOD), date=get_today(info),
+            ),
         )
 
     def resolve_stats_users_monthly(self, info, **kwargs):
         return Query._get_stat_date_counts(
+            info,
             'users_monthly',
             value=kwargs.get('value'),
             item_type=kwargs.get('itemType'),
-            from_date=Query._get_from_date_from_period(kwargs.get('period', Query.DEFAULT_PERIOD)),
+            from_date=Query._get_from_date_from_period(
+                kwargs.get('period', Query.DEFAULT_PERIOD), date=get_today(info),
+            ),
         )
 
     def resolve_stats_users_per_node(self, info, **kwargs):
-        qs = Stat.objects.filter(date__gte=Query._get_from_date_from_period(kwargs.get('period', Query.DEFAULT_PERIOD)))
-        if kwargs.get('value') and kwargs.get('itemType'):
-            if kwargs.get('itemType') == 'platform':
-                qs = qs.filter(node__platform__name=kwargs.get('value'))
-            elif kwargs.get('itemType') == 'protocol':
-                qs = qs.filter(node__protocols__name=kwargs.get('value'))
-            elif kwargs.get('itemType') == 'node':
-                qs = qs.filter(node__host=kwargs.get('value'))
-            else:
-                raise ValueError('itemType should be "platform", "node" or "protocol')
-        else:
-            qs = qs.filter(node__isnull=False)
-        return qs.values('date').annotate(
-            count=Avg('users_total')
-        ).values('date', 'count').order_by('date')
+        item_type = kwargs.get('itemType')
+        value = kwargs.get('value')
+        return Query._get_series_model(item_type, value).objects.users_per_node(
+            from_date=Query._get_from_date_from_period(
+                kwargs.get('period', Query.DEFAULT_PERIOD), date=get_today(info),
+            ),
+            item_type=item_type,
+            value=value,
+        )
 
     def resolve_stats_users_weekly(self, info, **kwargs):
         return Query._get_stat_date_counts(
+            info,
             'users_weekly',
             value=kwargs.get('value'),
             item_type=kwargs.get('itemType'),
-            from_date=Query._get_from_date_from_period(kwargs.get('period', Query.DEFAULT_PERIOD)),
+            from_date=Query._get_from_date_from_period(
+                kwargs.get('period', Query.DEFAULT_PERIOD), date=get_today(info),
+            ),
         )
 
     def resolve_stats_local_posts(self, info, **kwargs):
         return Query._get_stat_date_counts(
+            info,
             'local_posts',
             value=kwargs.get('value'),
             item_type=kwargs.get('itemType'),
-            from_date=Query._get_from_date_from_period(kwargs.get('period', Query.DEFAULT_PERIOD)),
+            from_date=Query._get_from_date_from_period(
+                kwargs.get('period', Query.DEFAULT_PERIOD), date=get_today(info),
+            ),
         )
 
     def resolve_stats_local_comments(self, info, **kwargs):
         return Query._get_stat_date_counts(
+            info,
             'local_comments',
             value=kwargs.get('value'),
             item_type=kwargs.get('itemType'),
-            from_date=Query._get_from_date_from_period(kwargs.get('period', Query.DEFAULT_PERIOD)),
+            from_date=Query._get_from_date_from_period(
+                kwargs.get('period', Query.DEFAULT_PERIOD), date=get_today(info),
+            ),
         )
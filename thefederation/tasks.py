@@ -3,15 +3,18 @@ import logging
 
 import geoip2.database
 from django.conf import settings
+from django.core.cache import cache
 from django.core.management import call_command
-from django.db.models import Sum
+from django.db import transaction
+from django.db.models import Count, Sum
 from django.utils.timezone import now
 from django_rq import job
 from federation.hostmeta import fetchers
 from federation.utils.network import fetch_host_ip
 
 from thefederation.enums import Relay
-from thefederation.models import Node, Platform, Protocol, Service, Stat
+from thefederation.models import Node, Platform, Protocol, Service, Stat, StatDailyRollup
+from thefederation.utils import stat_cache_key
 
 logger = logging.getLogger(__name__)
 
@@ -69,6 +72,49 @@ def aggregate_daily_stats(date=None):
         )
     # Add global stat
     Stat.objects.update_or_create(date=date, protocol=None, platform=None, node=None, defaults=totals)
+    aggregate_daily_rollups(date)
+    # Polls done after the last aggregation of the previous day only make it to its rollups now
+    aggregate_daily_rollups(date - datetime.timedelta(days=1))
+    clear_stat_cache(date)
+
+
+def clear_stat_cache(date):
+    """
+    Remove the cached stats of a date, so that freshly aggregated stats get served.
+    """
+    keys = [stat_cache_key('global', date, None, None)]
+    for name in Platform.objects.values_list('name', flat=True):
+        keys += [stat_cache_key('platform', date, name), stat_cache_key('global', date, name, None)]
+    for name in Protocol.objects.values_list('name', flat=True):
+        keys += [stat_cache_key('protocol', date, name), stat_cache_key('global', date, None, name)]
+    cache.delete_many(keys)
+
+
+def aggregate_daily_rollups(date=None):
+    """
+    Sum up the node stats of a date for all nodes and per platform and protocol.
+    """
+    if not date:
+        date = now().date()
+    sums = {f'sum_{stat}': Sum(stat) for stat in StatDailyRollup.STATS}
+    sums['node_count'] = Count('users_total')
+    qs = Stat.objects.filter(node__isnull=False, date=date)
+    rows = [(StatDailyRollup.ITEM_TYPE_ALL, '', qs.aggregate(**sums))]
+    for item_type, lookup in (
+        (StatDailyRollup.ITEM_TYPE_PLATFORM, 'node__platform__name'),
+        (StatDailyRollup.ITEM_TYPE_PROTOCOL, 'node__protocols__name'),
+    ):
+        for row in qs.filter(**{f'{lookup}__isnull': False}).values(lookup).annotate(**sums).order_by():
+            rows.append((item_type, row[lookup], row))
+    with transaction.atomic():
+        # Replace any earlier rollups of the date, so that platforms and protocols without node stats anymore go away
+        StatDailyRollup.objects.filter(date=date).delete()
+        StatDailyRollup.objects.bulk_create([
+            StatDailyRollup(
+                date=date, item_type=item_type, value=value, node_count=row['node_count'],
+                **{stat: row[f'sum_{stat}'] for stat in StatDailyRollup.STATS}
+            ) for item_type, value, row in rows
+        ])
 
 
 def clean_duplicate_nodes():
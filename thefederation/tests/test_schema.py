@@ -1,8 +1,11 @@
 import datetime
+from types import SimpleNamespace
 
 from django.utils.timezone import now
 
-from thefederation.tests.factories import NodeFactory, StatFactory
+from thefederation.models import Service, Stat
+from thefederation.tasks import aggregate_daily_rollups, aggregate_daily_stats
+from thefederation.tests.factories import NodeFactory, PlatformFactory, StatFactory
 from thefederation.tests.utils import SchemaTestCase
 
 
@@ -18,6 +21,44 @@ class QueryResolveNodesTestCase(SchemaTestCase):
         response = self.glient.execute("query { nodes { id }}")
         self.assertTrue('nodes' in response['data'])
 
+    def test_resolves_services_in_one_query(self):
+        service = Service.objects.create(name='xmpp')
+        self.node.services.add(service)
+        NodeFactory(active=True)
+        with self.assertNumQueries(2):
+            response = self.glient.execute("query { nodes { services { name }}}", context_value=SimpleNamespace())
+        self.assertCountEqual(response['data']['nodes'], [{'services': [{'name': 'xmpp'}]}, {'services': []}])
+
+    def test_resolves_only_selected_fields(self):
+        with self.assertNumQueries(1):
+            response = self.glient.execute("query { nodes { host openSignups countryCode }}")
+        self.assertEqual(response['data']['nodes'], [
+            {'host': self.node.host, 'openSignups': self.node.open_signups, 'countryCode': ''},
+        ])
+
+    def test_resolves_relations_selected_through_fragment(self):
+        response = self.glient.execute(
+            "query { nodes { ...nodeFields }} fragment nodeFields on NodeType { platform { name } services { name }}"
+        )
+        self.assertEqual(response['data']['nodes'][0], {'platform': {'name': self.node.platform.name}, 'services': []})
+
+    def test_resolves_stats_as_list(self):
+        StatFactory(node=self.node, users_total=3)
+        response = self.glient.execute("query { nodes { stats { usersTotal }}}")
+        self.assertEqual(response['data']['nodes'], [{'stats': [{'usersTotal': 3}]}])
+
+    def test_ordered_by_users(self):
+        second_node = NodeFactory(active=True)
+        third_node = NodeFactory(active=True)
+        StatFactory(node=self.node, users_monthly=1)
+        StatFactory(node=second_node, users_monthly=5)
+        response = self.glient.execute("query { nodes { id users }}", context_value=SimpleNamespace())
+        self.assertEqual(response['data']['nodes'], [
+            {'id': str(second_node.id), 'users': 5},
+            {'id': str(self.node.id), 'users': 1},
+            {'id': str(third_node.id), 'users': None},
+        ])
+
 
 class QueryResolvePlatformsTestCase(SchemaTestCase):
     def test_contains_only_active(self):
@@ -31,6 +72,12 @@ class QueryResolvePlatformsTestCase(SchemaTestCase):
         response = self.glient.execute("query { platforms { id }}")
         self.assertTrue('platforms' in response['data'])
 
+    def test_resolves_node_users(self):
+        StatFactory(node=self.node, users_monthly=3)
+        StatFactory(node=self.node, users_monthly=2, date=now().date() - datetime.timedelta(days=1))
+        response = self.glient.execute("query { platforms { nodes { users }}}", context_value=SimpleNamespace())
+        self.assertEqual(response['data']['platforms'][0]['nodes'], [{'users': 3}])
+
 
 class QueryResolveProtocolsTestCase(SchemaTestCase):
     def test_contains_only_active(self):
@@ -84,6 +131,7 @@ class QueryResolveStatsUsersActiveRatioTestCase(SchemaTestCase):
         cls.second_node = NodeFactory(active=True)
         StatFactory(node=cls.node, users_monthly=1, users_total=2)
         StatFactory(node=cls.second_node, users_monthly=1, users_total=4)
+        aggregate_daily_rollups()
 
     def test_contains_result(self):
         response = self.glient.execute(
@@ -91,6 +139,21 @@ class QueryResolveStatsUsersActiveRatioTestCase(SchemaTestCase):
         )
         self.assertAlmostEqual(response['data']['statsUsersActiveRatio'][0]['count'], 0.33333333)
 
+    def test_contains_result__no_total_users(self):
+        yesterday = now().date() - datetime.timedelta(days=1)
+        StatFactory(node=self.node, users_monthly=0, users_total=0, date=yesterday)
+        aggregate_daily_rollups(yesterday)
+        response = self.glient.execute(
+            "query { statsUsersActiveRatio { count }}"
+        )
+        self.assertIsNone(response['data']['statsUsersActiveRatio'][0]['count'])
+
+    def test_contains_result__node(self):
+        response = self.glient.execute(
+            'query { statsUsersActiveRatio(itemType: "node", value: "%s") { count }}' % self.second_node.host
+        )
+        self.assertAlmostEqual(response['data']['statsUsersActiveRatio'][0]['count'], 0.25)
+
 
 class QueryResolveStatsUsersPerNodeTestCase(SchemaTestCase):
     @classmethod
@@ -99,9 +162,176 @@ class QueryResolveStatsUsersPerNodeTestCase(SchemaTestCase):
         cls.second_node = NodeFactory(active=True)
         StatFactory(node=cls.node, users_total=1)
         StatFactory(node=cls.second_node, users_total=3)
+        aggregate_daily_rollups()
 
     def test_contains_result(self):
         response = self.glient.execute(
             "query { statsUsersPerNode { count }}"
         )
         self.assertEqual(response['data']['statsUsersPerNode'][0]['count'], 2)
+
+    def test_contains_result__node(self):
+        response = self.glient.execute(
+            'query { statsUsersPerNode(itemType: "node", value: "%s") { count }}' % self.second_node.host
+        )
+        self.assertEqual(response['data']['statsUsersPerNode'][0]['count'], 3)
+
+
+class QueryResolveStatsDateCountsTestCase(SchemaTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.second_node = NodeFactory(active=True)
+        StatFactory(node=cls.node, users_monthly=1, users_total=2)
+        StatFactory(node=cls.second_node, users_monthly=1, users_total=4)
+        aggregate_daily_rollups()
+
+    def test_contains_result(self):
+        response = self.glient.execute(
+            "query { statsUsersTotal { count }}"
+        )
+        self.assertEqual(response['data']['statsUsersTotal'][0]['count'], 6)
+
+    def test_series_share_one_query(self):
+        with self.assertNumQueries(1):
+            response = self.glient.execute(
+                "query { statsUsersTotal { count } statsUsersMonthly { count }}",
+                context_value=SimpleNamespace(),
+            )
+        self.assertEqual(response['data']['statsUsersTotal'][0]['count'], 6)
+        self.assertEqual(response['data']['statsUsersMonthly'][0]['count'], 2)
+
+    def test_invalid_item_type_only_fails_its_own_series(self):
+        response = self.glient.execute(
+            'query { statsUsersTotal { count } statsUsersMonthly(itemType: "foo", value: "x") { count }}',
+            context_value=SimpleNamespace(),
+        )
+        self.assertEqual(response['data']['statsUsersTotal'], [{'count': 6}])
+        self.assertIsNone(response['data']['statsUsersMonthly'])
+        self.assertEqual(len(response['errors']), 1)
+        self.assertEqual(response['errors'][0]['path'], ['statsUsersMonthly'])
+
+    def test_period_is_counted_from_request_date(self):
+        response = self.glient.execute(
+            'query { statsUsersTotal(period: "5d") { count }}',
+            context_value=SimpleNamespace(today=now().date() + datetime.timedelta(days=10)),
+        )
+        self.assertEqual(response['data']['statsUsersTotal'], [])
+
+    def test_contains_result__platform(self):
+        response = self.glient.execute(
+            'query { statsUsersTotal(itemType: "platform", value: "%s") { count }}' % self.node.platform.name
+        )
+        self.assertEqual(response['data']['statsUsersTotal'][0]['count'], 2)
+
+    def test_contains_result__node(self):
+        response = self.glient.execute(
+            'query { statsUsersTotal(itemType: "node", value: "%s") { count }}' % self.second_node.host
+        )
+        self.assertEqual(response['data']['statsUsersTotal'][0]['count'], 4)
+
+
+class QueryResolveStatsPlatformTodayTestCase(SchemaTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.platform = PlatformFactory(name='foo')
+        cls.second_platform = PlatformFactory(name='bar')
+        StatFactory(node=None, platform=cls.platform, users_total=2)
+        StatFactory(node=None, platform=cls.second_platform, users_total=4)
+
+    def test_platforms_share_one_query(self):
+        with self.assertNumQueries(1):
+            response = self.glient.execute(
+                'query { foo: statsPlatformToday(name: "foo") { usersTotal } '
+                'bar: statsPlatformToday(name: "bar") { usersTotal } '
+                'baz: statsPlatformToday(name: "baz") { usersTotal }}',
+                context_value=SimpleNamespace(),
+            )
+        self.assertEqual(response['data'], {
+            'foo': {'usersTotal': 2},
+            'bar': {'usersTotal': 4},
+            'baz': None,
+        })
+
+
+class QueryResolveStatsTestCase(SchemaTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.stat = StatFactory(node=cls.node, date=now().date())
+        cls.old_stat = StatFactory(node=cls.node, date=now().date() - datetime.timedelta(days=1))
+
+    def test_paginates(self):
+        response = self.glient.execute("query { stats(first: 1) { edges { node { id }} pageInfo { hasNextPage }}}")
+        self.assertEqual(response['data']['stats'], {
+            'edges': [{'node': {'id': str(self.stat.id)}}],
+            'pageInfo': {'hasNextPage': True},
+        })
+
+    def test_requires_page_size(self):
+        response = self.glient.execute("query { stats { edges { node { id }}}}")
+        self.assertIn('errors', response)
+
+
+class QueryResolveStatsNodesTestCase(SchemaTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.second_node = NodeFactory(active=True)
+        StatFactory(node=cls.node, users_total=2)
+        StatFactory(node=cls.second_node, users_total=4)
+        StatFactory(node=cls.node, users_total=1, date=now().date() - datetime.timedelta(days=1))
+
+    def test_contains_todays_stats(self):
+        response = self.glient.execute("query { statsNodes { usersTotal }}")
+        self.assertEqual(sorted(stat['usersTotal'] for stat in response['data']['statsNodes']), [2, 4])
+
+    def test_filters_by_platform(self):
+        response = self.glient.execute(
+            'query { statsNodes(platform: "%s") { usersTotal }}' % self.second_node.platform.name
+        )
+        self.assertEqual(response['data']['statsNodes'], [{'usersTotal': 4}])
+
+    def test_filters_by_host(self):
+        response = self.glient.execute('query { statsNodes(host: "%s") { usersTotal }}' % self.node.host)
+        self.assertEqual(response['data']['statsNodes'], [{'usersTotal': 2}])
+
+
+class QueryResolveStatsTodayCacheTestCase(SchemaTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.protocol = cls.node.protocols.first()
+        StatFactory(node=cls.node, users_total=2)
+        aggregate_daily_stats()
+
+    def execute(self):
+        return self.glient.execute(
+            'query { statsGlobalToday { usersTotal } '
+            'statsPlatformToday(name: "%s") { usersTotal } '
+            'statsProtocolToday(name: "%s") { usersTotal }}' % (self.node.platform.name, self.protocol.name),
+            context_value=SimpleNamespace(),
+        )
+
+    def test_served_from_cache(self):
+        response = self.execute()
+        with self.assertNumQueries(0):
+            cached_response = self.execute()
+        self.assertEqual(cached_response['data'], response['data'])
+        self.assertEqual(cached_response['data'], {
+            'statsGlobalToday': {'usersTotal': 2},
+            'statsPlatformToday': {'usersTotal': 2},
+            'statsProtocolToday': {'usersTotal': 2},
+        })
+
+    def test_aggregation_makes_fresh_stats_visible(self):
+        self.execute()
+        Stat.objects.filter(node=self.node).update(users_total=5)
+        self.assertEqual(self.execute()['data']['statsGlobalToday'], {'usersTotal': 2})
+        aggregate_daily_stats()
+        self.assertEqual(self.execute()['data'], {
+            'statsGlobalToday': {'usersTotal': 5},
+            'statsPlatformToday': {'usersTotal': 5},
+            'statsProtocolToday': {'usersTotal': 5},
+        })
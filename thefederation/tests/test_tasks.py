@@ -1,11 +1,67 @@
+import datetime
 from unittest.mock import patch
 
+from django.core.cache import cache
 from django.utils.timezone import now
 from test_plus import TestCase
 
-from thefederation.models import Stat
-from thefederation.tasks import poll_node, fetch_using_method
+from thefederation.models import Stat, StatDailyRollup
+from thefederation.tasks import (
+    poll_node, fetch_using_method, aggregate_daily_rollups, aggregate_daily_stats, clear_stat_cache,
+)
+from thefederation.tests.factories import NodeFactory, PlatformFactory, StatFactory
 from thefederation.tests.fixtures import FETCH_NODE_RESPONSE, FETCH_NODE_RESPONSE__NO_STATS
+from thefederation.utils import stat_cache_key
+
+
+class AggregateDailyRollupsTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.node = NodeFactory()
+        cls.second_node = NodeFactory(platform=cls.node.platform)
+        StatFactory(node=cls.node, users_total=1, local_posts=None)
+        StatFactory(node=cls.second_node, users_total=3, local_posts=None)
+
+    def test_creates_rollups(self):
+        aggregate_daily_rollups()
+        rollup = StatDailyRollup.objects.get(item_type='all')
+        self.assertEqual(rollup.date, now().date())
+        self.assertEqual(rollup.users_total, 4)
+        self.assertEqual(rollup.node_count, 2)
+        self.assertIsNone(rollup.local_posts)
+        rollup = StatDailyRollup.objects.get(item_type='platform')
+        self.assertEqual(rollup.value, self.node.platform.name)
+        self.assertEqual(rollup.users_total, 4)
+        self.assertEqual(StatDailyRollup.objects.filter(item_type='protocol').count(), 2)
+
+    def test_aggregate_daily_stats_also_rolls_up_previous_day(self):
+        yesterday = now().date() - datetime.timedelta(days=1)
+        aggregate_daily_stats()
+        # A late poll of the previous day after its last aggregation
+        StatFactory(node=self.node, users_total=5, date=yesterday)
+        aggregate_daily_stats()
+        rollup = StatDailyRollup.objects.get(item_type='all', date=yesterday)
+        self.assertEqual(rollup.users_total, 5)
+
+    def test_replaces_earlier_rollups(self):
+        aggregate_daily_rollups()
+        Stat.objects.filter(node=self.second_node).delete()
+        aggregate_daily_rollups()
+        self.assertEqual(StatDailyRollup.objects.get(item_type='all').users_total, 1)
+
+
+class ClearStatCacheTestCase(TestCase):
+    def test_deletes_cached_stats_of_date(self):
+        platform = PlatformFactory()
+        date = now().date()
+        cache.set(stat_cache_key('global', date, None, None), 'foo')
+        cache.set(stat_cache_key('platform', date, platform.name), 'foo')
+        cache.set(stat_cache_key('global', date, platform.name, None), 'foo')
+        clear_stat_cache(date)
+        self.assertIsNone(cache.get(stat_cache_key('global', date, None, None)))
+        self.assertIsNone(cache.get(stat_cache_key('platform', date, platform.name)))
+        self.assertIsNone(cache.get(stat_cache_key('global', date, platform.name, None)))
 
 
 class FetchUsingMethodTestCase(TestCase):
@@ -1,3 +1,4 @@
+from django.core.cache import cache
 from graphene.test import Client
 from test_plus import TestCase
 
@@ -13,4 +14,5 @@ class SchemaTestCase(TestCase):
         cls.inactive_node = NodeFactory()
 
     def setUp(self):
+        cache.clear()
         self.glient = Client(schema)
@@ -1,3 +1,4 @@
+import datetime
 import re
 
 
@@ -33,3 +34,13 @@ def single_true(iterable):
     """
     i = iter(iterable)
     return any(i) and not any(i)
+
+
+def stat_cache_key(kind: str, date: datetime.date, *names: str) -> str:
+    """
+    Get the cache key of a stat for a date.
+
+    :param kind: "global", "platform" or "protocol"
+    :param names: Names the stat was looked up with, empty or None if not used
+    """
+    return ":".join(["stats", kind, date.isoformat()] + [name or "" for name in names])